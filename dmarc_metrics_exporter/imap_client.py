@@ -15,7 +15,16 @@ from asyncio import (
 )
 from dataclasses import dataclass
 from enum import Enum
-from typing import Callable, Coroutine, Dict, FrozenSet, Literal, Optional, Union
+from typing import (
+    Callable,
+    Coroutine,
+    Dict,
+    FrozenSet,
+    List,
+    Literal,
+    Optional,
+    Union,
+)
 
 import structlog
 from bite import parse_incremental
@@ -92,10 +101,20 @@ class _ImapTag:
 
 
 class _ImapCommandWriter:
-    def __init__(self, writer: StreamWriter, server_ready: Event, timeout_seconds: int):
+    # RFC 7888: with LITERAL- only literals up to this size may be non-synchronizing
+    LITERAL_MINUS_MAX_SIZE = 4096
+
+    def __init__(
+        self,
+        writer: StreamWriter,
+        continuation_requested: Event,
+        timeout_seconds: int,
+        capabilities: FrozenSet[str] = frozenset(),
+    ):
         self.writer = writer
-        self._server_ready = server_ready
+        self._continuation_requested = continuation_requested
         self.timeout_seconds = timeout_seconds
+        self._capabilities = capabilities
 
     async def _drain(self):
         await asyncio.wait_for(self.writer.drain(), timeout=self.timeout_seconds)
@@ -108,28 +127,94 @@ class _ImapCommandWriter:
         self.writer.write(str(num).encode("ascii"))
         await self._drain()
 
+    async def write_string(self, string: str):
+        encoded = string.encode("utf-8")
+        if self._is_quotable(encoded):
+            await self.write_quoted_string(encoded)
+        else:
+            await self.write_string_literal(string)
+
+    async def write_quoted_string(self, encoded: bytes):
+        escaped = encoded.replace(b"\\", b"\\\\").replace(b'"', b'\\"')
+        await self.write_raw(b'"' + escaped + b'"')
+
     async def write_string_literal(self, string: str):
         encoded = string.encode("utf-8")
-        self._server_ready.clear()
-        await self.write_raw(b"{" + str(len(encoded)).encode("ascii") + b"}\r\n")
-        await self._server_ready.wait()
+        size = str(len(encoded)).encode("ascii")
+        if self._allows_non_synchronizing_literal(len(encoded)):
+            self.writer.write(b"{" + size + b"+}\r\n")
+            await self.write_raw(encoded)
+            return
+
+        self._continuation_requested.clear()
+        await self.write_raw(b"{" + size + b"}\r\n")
+        await asyncio.wait_for(
+            self._continuation_requested.wait(), timeout=self.timeout_seconds
+        )
 
         await self.write_raw(encoded)
 
+    def _allows_non_synchronizing_literal(self, size: int) -> bool:
+        return "LITERAL+" in self._capabilities or (
+            "LITERAL-" in self._capabilities and size <= self.LITERAL_MINUS_MAX_SIZE
+        )
+
+    @staticmethod
+    def _is_quotable(encoded: bytes) -> bool:
+        return encoded.isascii() and not any(c in encoded for c in b"\0\r\n")
+
+
+class _CommandScheduler:
+    """Decides which commands may be in flight at the same time.
+
+    Follows the rules for pipelining commands given in RFC 3501, section 5.5:
+    Commands changing the connection state are executed in isolation, and
+    commands using message sequence numbers are not sent while a command is in
+    progress that permits the server to send EXPUNGE responses.
+    """
+
+    EXCLUSIVE = frozenset(
+        (
+            "AUTHENTICATE",
+            "CAPABILITY",
+            "CLOSE",
+            "COMPRESS",
+            "EXAMINE",
+            "LOGIN",
+            "LOGOUT",
+            "SELECT",
+            "STARTTLS",
+            "UNSELECT",
+        )
+    )
+    USING_SEQUENCE_NUMBERS = frozenset(("COPY", "FETCH", "MOVE", "SEARCH", "STORE"))
+    PROHIBITING_EXPUNGE = frozenset(("FETCH", "SEARCH", "STORE"))
+
+    _in_flight: List[str]
 
-class _CommandsInUse:
     def __init__(self):
-        self._in_use = set()
+        self._in_flight = []
         self._change_condition = asyncio.Condition()
 
+    def _may_start(self, name: str) -> bool:
+        if any(command in self.EXCLUSIVE for command in self._in_flight):
+            return False
+        if name in self.EXCLUSIVE:
+            return not self._in_flight
+        if name in self.USING_SEQUENCE_NUMBERS:
+            return all(
+                command in self.PROHIBITING_EXPUNGE for command in self._in_flight
+            )
+        return True
+
     async def acquire(self, name: str):
         async with self._change_condition:
-            await self._change_condition.wait_for(lambda: name not in self._in_use)
-            self._in_use.add(name)
+            await self._change_condition.wait_for(lambda: self._may_start(name))
+            self._in_flight.append(name)
 
     async def release(self, name: str):
         async with self._change_condition:
-            self._in_use.remove(name)
+            self._in_flight.remove(name)
             self._change_condition.notify_all()
 
 
@@ -147,9 +232,10 @@ class ImapClient:
         self.fetched_queue = Queue()
         self._last_response = time.time()
         self._capabilities = frozenset()
-        self._ongoing_commands = _CommandsInUse()
+        self._scheduler = _CommandScheduler()
         self._command_lock = Lock()
         self._server_ready = Event()
+        self._continuation_requested = Event()
         self._process_responses_task = None
         self._writer = None
         self._tag_gen = (f"a{i}".encode("ascii") for i in itertools.count())
@@ -200,7 +286,7 @@ class ImapClient:
                 self._last_response = time.time()
 
                 if response[0] == b"+":
-                    self._server_ready.set()
+                    self._continuation_requested.set()
                 elif response[0] == b"*":
                     await self._process_untagged_response(response)
                 else:
@@ -242,31 +328,43 @@ class ImapClient:
         tag = _ImapTag(next(self._tag_gen))
         self._tag_completions[tag.name] = tag
         wait_response = asyncio.ensure_future(tag.wait_response())
+        acquired = False
         try:
-            await self._ongoing_commands.acquire(name)
-
+            # Admission happens while holding the lock, so commands are sent in
+            # the order they were admitted. A command that has to wait for
+            # in-flight commands thus also delays all commands issued after it.
+            # This head-of-line blocking keeps commands in order and prevents
+            # starvation of commands that may only run in isolation.
             async with self._command_lock:
+                await self._wait_with_inactivity_timeout(
+                    asyncio.ensure_future(self._scheduler.acquire(name)),
+                    "Waiting for in-flight commands timed out.",
+                )
+                acquired = True
                 self._writer.write(tag.name)
                 self._writer.write(b" ")
                 cmd_writer = _ImapCommandWriter(
-                    self._writer, self._server_ready, self.timeout_seconds
+                    self._writer,
+                    self._continuation_requested,
+                    self.timeout_seconds,
+                    self._capabilities,
                 )
-                _, pending = await asyncio.wait(
-                    [asyncio.ensure_future(write_command(cmd_writer)), wait_response],
-                    return_when=asyncio.FIRST_COMPLETED,
+                write = asyncio.ensure_future(write_command(cmd_writer))
+                await asyncio.wait(
+                    [write, wait_response], return_when=asyncio.FIRST_COMPLETED
                 )
-
-            while not wait_response.done():
-                _, pending = await asyncio.wait(
-                    [wait_response], timeout=self.timeout_seconds
-                )
-                if (
-                    not wait_response.done()
-                    and self.timeout_seconds < time.time() - self._last_response
-                ):
-                    for future in pending:
-                        future.cancel()
-                    raise asyncio.TimeoutError("Waiting for response timed out.")
+                if not write.done():
+                    # The server completed the command before it was fully
+                    # sent, e.g. by rejecting it while we waited for a literal
+                    # continuation. The writer must not continue writing into
+                    # the stream once the lock is released.
+                    write.cancel()
+                elif not write.cancelled():
+                    write.result()
+
+            await self._wait_with_inactivity_timeout(
+                wait_response, "Waiting for response timed out."
+            )
 
             if tag.state and not tag.state.upper() == b"OK":
                 raise ImapServerError(name, tag.state, tag.text)
@@ -274,14 +372,26 @@ class ImapClient:
             del self._tag_completions[tag.name]
             if not wait_response.done():
                 wait_response.cancel()
-            await self._ongoing_commands.release(name)
+            if acquired:
+                await self._scheduler.release(name)
+
+    async def _wait_with_inactivity_timeout(self, future: asyncio.Future, msg: str):
+        while not future.done():
+            await asyncio.wait([future], timeout=self.timeout_seconds)
+            if (
+                not future.done()
+                and self.timeout_seconds < time.time() - self._last_response
+            ):
+                future.cancel()
+                raise asyncio.TimeoutError(msg)
+        future.result()
 
     async def _login(self, username: str, password: str):
         async def login_writer(cmd_writer: _ImapCommandWriter):
             await cmd_writer.write_raw(b"LOGIN ")
-            await cmd_writer.write_string_literal(username)
+            await cmd_writer.write_string(username)
             await cmd_writer.write_raw(b" ")
-            await cmd_writer.write_string_literal(password)
+            await cmd_writer.write_string(password)
             await cmd_writer.write_raw(b"\r\n")
 
         await self._command("LOGIN", login_writer)
@@ -304,7 +414,7 @@ class ImapClient:
     async def select(self, mailbox: str = "INBOX") -> Optional[int]:
         async def select_writer(cmd_writer: _ImapCommandWriter):
             await cmd_writer.write_raw(b"SELECT ")
-            await cmd_writer.write_string_literal(mailbox)
+            await cmd_writer.write_string(mailbox)
             await cmd_writer.write_raw(b"\r\n")
 
         await self._command("SELECT", select_writer)
@@ -323,7 +433,7 @@ class ImapClient:
     async def create(self, name: str):
         async def create_writer(cmd_writer: _ImapCommandWriter):
             await cmd_writer.write_raw(b"CREATE ")
-            await cmd_writer.write_string_literal(name)
+            await cmd_writer.write_string(name)
             await cmd_writer.write_raw(b"\r\n")
 
         await self._command("CREATE", create_writer)
@@ -337,7 +447,7 @@ class ImapClient:
     async def delete(self, name: str):
         async def create_writer(cmd_writer: _ImapCommandWriter):
             await cmd_writer.write_raw(b"DELETE ")
-            await cmd_writer.write_string_literal(name)
+            await cmd_writer.write_string(name)
             await cmd_writer.write_raw(b"\r\n")
 
         await self._command("DELETE", create_writer)
@@ -347,7 +457,7 @@ class ImapClient:
             await cmd_writer.write_raw(b"UID COPY ")
             await cmd_writer.write_int(uid)
             await cmd_writer.write_raw(b" ")
-            await cmd_writer.write_string_literal(destination)
+            await cmd_writer.write_string(destination)
             await cmd_writer.write_raw(b"\r\n")
 
         await self._command("UID COPY", uid_copy_writer)
@@ -357,7 +467,7 @@ class ImapClient:
             await cmd_writer.write_raw(b"UID MOVE ")
             await cmd_writer.write_int(uid)
             await cmd_writer.write_raw(b" ")
-            await cmd_writer.write_string_literal(destination)
+            await cmd_writer.write_string(destination)
             await cmd_writer.write_raw(b"\r\n")
 
         await self._command("UID MOVE", uid_move_writer)
@@ -378,7 +488,7 @@ class ImapClient:
             await cmd_writer.write_raw(flags)
             await cmd_writer.write_raw(b"\r\n")
 
-        await self._command("STORE", uid_store_writer)
+        await self._command("UID STORE", uid_store_writer)
 
     async def expunge(self):
         async def expunge_writer(cmd_writer: _ImapCommandWriter):
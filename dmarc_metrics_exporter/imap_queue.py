@@ -1,11 +1,22 @@
 import asyncio
 import contextlib
 import email.policy
+import functools
 from asyncio.tasks import Task
 from dataclasses import astuple, dataclass
 from email.message import EmailMessage
 from email.parser import BytesParser
-from typing import Any, Awaitable, Callable, Iterable, Optional, Tuple, cast
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    cast,
+)
 from urllib.parse import ParseResult
 
 import structlog
@@ -81,32 +92,98 @@ class ImapQueue:
                         b"1:" + str(msg_count).encode("ascii"), b"(UID RFC822)"
                     )
                 )
-                while not fetch_task.done() or not client.fetched_queue.empty():
-                    fetched = await client.fetched_queue.get()
-                    uid, msg = self._extract_uid_and_msg(fetched)
-                    if uid is None:
-                        await log.awarning("Failed to extract UID.", message=fetched[0])
-                    elif msg is None:
-                        await log.awarning(
-                            "Failed to extract RFC822 message for message.",
-                            message=fetched[0],
-                            uid=uid,
-                        )
-                    else:
-                        try:
-                            await asyncio.gather(
-                                log.adebug("Processing message.", uid=uid),
-                                handler(msg),
-                            )
-                        except Exception:  # pylint: disable=broad-except
-                            await log.aexception(
-                                "Handler for message in IMAP queue failed."
+                # Moves are pipelined and only awaited once all messages have
+                # been handed to the handler.
+                move_tasks: List[Task[None]] = []
+                move_failed = asyncio.Event()
+                try:
+                    async with contextlib.aclosing(
+                        self._iter_fetched(client, fetch_task)
+                    ) as fetched_responses:
+                        async for fetched in fetched_responses:
+                            if move_failed.is_set():
+                                # Most likely the connection is broken. Stop
+                                # handling messages that cannot be moved anyway.
+                                break
+                            move_task = await self._process_fetched(
+                                client, fetched, handler
                             )
-                            await client.uid_move_graceful(uid, self.folders.error)
-                        else:
-                            await client.uid_move_graceful(uid, self.folders.done)
-                await log.adebug("Processed all messages.")
-                await fetch_task
+                            if move_task is not None:
+                                move_task.add_done_callback(
+                                    functools.partial(
+                                        self._signal_failed_move, move_failed
+                                    )
+                                )
+                                move_tasks.append(move_task)
+                    await log.adebug("Processed all messages.")
+                    await fetch_task
+                finally:
+                    if not fetch_task.done():
+                        fetch_task.cancel()
+                    await self._await_moves(move_tasks)
+
+    @staticmethod
+    async def _iter_fetched(
+        client: ImapClient, fetch_task: Task[None]
+    ) -> AsyncGenerator[ParseResult, None]:
+        get: Optional[asyncio.Future] = None
+        try:
+            while True:
+                get = asyncio.ensure_future(client.fetched_queue.get())
+                await asyncio.wait(
+                    [get, fetch_task], return_when=asyncio.FIRST_COMPLETED
+                )
+                if get.done():
+                    yield get.result()
+                    continue
+                while not client.fetched_queue.empty():
+                    yield client.fetched_queue.get_nowait()
+                return
+        finally:
+            if get is not None and not get.done():
+                get.cancel()
+
+    async def _process_fetched(
+        self,
+        client: ImapClient,
+        fetched: ParseResult,
+        handler: Callable[[Any], Awaitable[None]],
+    ) -> Optional[Task[None]]:
+        log = logger.bind()
+        uid, msg = self._extract_uid_and_msg(fetched)
+        if uid is None:
+            await log.awarning("Failed to extract UID.", message=fetched[0])
+            return None
+        if msg is None:
+            await log.awarning(
+                "Failed to extract RFC822 message for message.",
+                message=fetched[0],
+                uid=uid,
+            )
+            return None
+        try:
+            await asyncio.gather(
+                log.adebug("Processing message.", uid=uid),
+                handler(msg),
+            )
+        except Exception:  # pylint: disable=broad-except
+            await log.aexception("Handler for message in IMAP queue failed.")
+            destination = self.folders.error
+        else:
+            destination = self.folders.done
+        return asyncio.create_task(client.uid_move_graceful(uid, destination))
+
+    @staticmethod
+    def _signal_failed_move(move_failed: asyncio.Event, move_task: Task[None]):
+        if not move_task.cancelled() and move_task.exception() is not None:
+            move_failed.set()
+
+    @staticmethod
+    async def _await_moves(move_tasks: List[Task[None]]):
+        results = await asyncio.gather(*move_tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                await logger.aerror("Failed to move message.", exc_info=result)
 
     @classmethod
     def _extract_uid_and_msg(
@@ -4,13 +4,15 @@ import ssl
 import time
 from dataclasses import astuple, dataclass
 from email.message import EmailMessage
-from typing import Any, Awaitable, Callable, Union
+from typing import Any, AsyncGenerator, Awaitable, Callable, Union
 
 import pytest
+import pytest_asyncio
 import requests
 
 from dmarc_metrics_exporter.imap_client import ImapClient
 from dmarc_metrics_exporter.imap_queue import ConnectionConfig
+from dmarc_metrics_exporter.tests.fake_imap_server import FakeImapServer
 
 
 @dataclass
@@ -76,6 +78,12 @@ def fixture_greenmail() -> Greenmail:
     return greenmail
 
 
+@pytest_asyncio.fixture(name="fake_imap")
+async def fixture_fake_imap() -> AsyncGenerator[FakeImapServer, None]:
+    async with FakeImapServer() as server:
+        yield server
+
+
 async def try_until_success(
     function: Union[Callable[[], Awaitable], Callable[[], Any]],
     timeout_seconds: int = 10,
@@ -0,0 +1,710 @@
+import asyncio
+import re
+import time
+from asyncio import Queue, StreamReader, StreamWriter, Task, create_task, start_server
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+import structlog
+
+from dmarc_metrics_exporter.imap_client import ConnectionConfig
+
+logger = structlog.get_logger()
+
+_Token = Union[bytes, "_Parenthesis"]
+_Arg = Union[bytes, Tuple[Any, ...]]
+
+
+class _Parenthesis:
+    def __init__(self, char: bytes):
+        self.char = char
+
+
+_OPEN = _Parenthesis(b"(")
+_CLOSE = _Parenthesis(b")")
+
+_LITERAL_PATTERN = re.compile(rb"\{(?P<size>\d+)(?P<non_sync>\+?)\}\r\n$")
+_TOKEN_PATTERN = re.compile(
+    rb"\s*(?:(?P<open>\()|(?P<close>\))"
+    rb'|"(?P<quoted>(?:[^"\\]|\\.)*)"'
+    rb"|(?P<atom>[^\s()\"\[]+(?:\[[^\]]*\])?(?:<[^>]*>)?))"
+)
+_FETCH_BODY_PATTERN = re.compile(
+    rb"^(?P<name>BODY(?:\.PEEK)?)\[(?P<section>[^\]]*)\]"
+    rb"(?:<(?P<offset>\d+)(?:\.(?P<length>\d+))?>)?$",
+    re.IGNORECASE,
+)
+# ALL and FULL would require ENVELOPE and BODY, which are not implemented.
+_FETCH_MACROS = {
+    b"FAST": (b"FLAGS", b"INTERNALDATE", b"RFC822.SIZE"),
+}
+
+
+def _tokenize(text: bytes) -> List[_Token]:
+    tokens: List[_Token] = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN_PATTERN.match(text, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f"Unable to tokenize command: {text!r}")
+        pos = match.end()
+        if match.group("open"):
+            tokens.append(_OPEN)
+        elif match.group("close"):
+            tokens.append(_CLOSE)
+        elif match.group("quoted") is not None:
+            tokens.append(re.sub(rb"\\(.)", rb"\1", match.group("quoted")))
+        else:
+            tokens.append(match.group("atom"))
+    return tokens
+
+
+def _nest(tokens: Iterable[_Token]) -> List[_Arg]:
+    stack: List[List[_Arg]] = [[]]
+    for token in tokens:
+        if token is _OPEN:
+            stack.append([])
+        elif token is _CLOSE:
+            if len(stack) < 2:
+                raise ValueError("Unbalanced parenthesis.")
+            nested = tuple(stack.pop())
+            stack[-1].append(nested)
+        else:
+            assert isinstance(token, bytes)
+            stack[-1].append(token)
+    if len(stack) != 1:
+        raise ValueError("Unbalanced parenthesis.")
+    return stack[0]
+
+
+def _atom(arg: _Arg) -> bytes:
+    if not isinstance(arg, bytes):
+        raise ValueError(f"Expected atom or string, got list {arg!r}")
+    return arg
+
+
+def _quote(value: bytes) -> bytes:
+    return b'"' + value.replace(b"\\", b"\\\\").replace(b'"', b'\\"') + b'"'
+
+
+def _literal(value: bytes) -> bytes:
+    return b"{" + str(len(value)).encode("ascii") + b"}\r\n" + value
+
+
+def _normalize_line_endings(content: bytes) -> bytes:
+    return content.replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+
+
+def _parse_sequence_set(sequence_set: bytes, largest: int) -> List[int]:
+    numbers: List[int] = []
+    for item in sequence_set.split(b","):
+        start, _, end = item.partition(b":")
+        first = largest if start == b"*" else int(start)
+        last = first if not end else (largest if end == b"*" else int(end))
+        if first > last:
+            first, last = last, first
+        numbers.extend(range(first, last + 1))
+    return sorted(set(numbers))
+
+
+@dataclass
+class FakeMessage:
+    uid: int
+    content: bytes
+    flags: Set[bytes] = field(default_factory=set)
+    internal_date: bytes = b"01-Jan-2024 00:00:00 +0000"
+
+    @property
+    def header(self) -> bytes:
+        separator = self.content.find(b"\r\n\r\n")
+        if separator < 0:
+            return self.content
+        return self.content[: separator + 4]
+
+    @property
+    def text(self) -> bytes:
+        return self.content[len(self.header) :]
+
+
+@dataclass
+class FakeMailbox:
+    messages: List[FakeMessage] = field(default_factory=list)
+    uid_validity: int = 1
+    uid_next: int = 1
+
+    def append(self, content: bytes, flags: Iterable[bytes] = ()) -> FakeMessage:
+        message = FakeMessage(
+            uid=self.uid_next, content=_normalize_line_endings(content)
+        )
+        message.flags.update(flags)
+        self.uid_next += 1
+        self.messages.append(message)
+        return message
+
+
+@dataclass
+class FakeImapServerStats:
+    commands: Counter = field(default_factory=Counter)
+    connections: int = 0
+    continuation_requests: int = 0
+    protocol_errors: int = 0
+    bytes_received: int = 0
+    bytes_sent: int = 0
+
+
+class _ThrottledWriter:
+    """Delays and rate-limits data sent to the client.
+
+    Each chunk becomes visible to the client ``latency_seconds`` after it was
+    written, and chunks are sent no faster than ``bandwidth_bytes_per_second``.
+    Because the delay is applied to the stream rather than to each command,
+    pipelined commands only pay for the latency once.
+    """
+
+    CHUNK_SIZE = 16 * 1024
+
+    def __init__(self, writer: StreamWriter, server: "FakeImapServer"):
+        self._writer = writer
+        self._server = server
+        self._loop = asyncio.get_running_loop()
+        self._pending: Queue[Tuple[float, Optional[bytes]]] = Queue()
+        self._send_task = create_task(self._send_loop())
+
+    def write(self, data: bytes):
+        self._server.stats.bytes_sent += len(data)
+        self._pending.put_nowait(
+            (self._loop.time() + self._server.latency_seconds, data)
+        )
+
+    async def _send_loop(self):
+        while True:
+            due, data = await self._pending.get()
+            if data is None:
+                return
+            delay = due - self._loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            bandwidth = self._server.bandwidth_bytes_per_second
+            if bandwidth is None:
+                self._writer.write(data)
+                await self._writer.drain()
+            else:
+                for start in range(0, len(data), self.CHUNK_SIZE):
+                    chunk = data[start : start + self.CHUNK_SIZE]
+                    self._writer.write(chunk)
+                    await self._writer.drain()
+                    await asyncio.sleep(len(chunk) / bandwidth)
+
+    def abort(self):
+        self._send_task.cancel()
+        self._writer.transport.abort()
+
+    async def close(self):
+        self._pending.put_nowait((self._loop.time(), None))
+        try:
+            await self._send_task
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+
+class _FakeImapConnection:
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self, server: "FakeImapServer", reader: StreamReader, writer: StreamWriter
+    ):
+        self.server = server
+        self.reader = reader
+        self.writer = _ThrottledWriter(writer, server)
+        self.authenticated = False
+        self.selected: Optional[FakeMailbox] = None
+        self._log = logger.bind(logger=self.__class__.__name__)
+        self._handlers: Dict[
+            bytes, Callable[[bytes, Sequence[_Arg]], Awaitable[Optional[bool]]]
+        ] = {
+            b"CAPABILITY": self._capability,
+            b"NOOP": self._noop,
+            b"LOGIN": self._login,
+            b"LOGOUT": self._logout,
+            b"SELECT": self._select,
+            b"EXAMINE": self._select,
+            b"CREATE": self._create,
+            b"DELETE": self._delete,
+            b"FETCH": self._fetch,
+            b"STORE": self._store,
+            b"COPY": self._copy,
+            b"MOVE": self._move,
+            b"EXPUNGE": self._expunge,
+            b"UID": self._uid,
+        }
+
+    async def run(self):
+        try:
+            self.writer.write(b"* OK IMAP4rev1 FakeImapServer ready\r\n")
+            while True:
+                command = await self._read_command()
+                if command is None:
+                    break
+                tag, args = command
+                if not await self._dispatch(tag, args):
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            await self.writer.close()
+
+    async def _read_command(self) -> Optional[Tuple[bytes, List[_Arg]]]:
+        tokens: List[_Token] = []
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return None
+            self.server.stats.bytes_received += len(line)
+            literal = _LITERAL_PATTERN.search(line)
+            tokens.extend(_tokenize(line[: literal.start()] if literal else line))
+            if not literal:
+                break
+            size = int(literal.group("size"))
+            if not literal.group("non_sync"):
+                self.server.stats.continuation_requests += 1
+                self.writer.write(b"+ Ready for literal data\r\n")
+            elif not self.server.accepts_non_synchronizing_literal(size):
+                await self._log.awarning(
+                    "Non-synchronizing literal not permitted.", size=size
+                )
+                self.server.stats.protocol_errors += 1
+            data = await self.reader.readexactly(size)
+            self.server.stats.bytes_received += len(data)
+            tokens.append(data)
+        if not tokens:
+            return b"", []
+        args = _nest(tokens)
+        tag = args[0] if isinstance(args[0], bytes) else b"*"
+        return tag, args[1:]
+
+    async def _dispatch(self, tag: bytes, args: Sequence[_Arg]) -> bool:
+        if not args or not isinstance(args[0], bytes):
+            self._tagged(tag, b"BAD", b"Missing command")
+            return True
+        command = args[0].upper()
+        self.server.stats.commands[command] += 1
+        await self._log.adebug("FakeImapServer received command.", command=command)
+        handler = self._handlers.get(command)
+        if handler is None:
+            self._tagged(tag, b"BAD", b"Unknown command " + command)
+            return True
+        if command not in (b"CAPABILITY", b"NOOP", b"LOGIN", b"LOGOUT") and (
+            not self.authenticated
+        ):
+            self._tagged(tag, b"NO", b"Not authenticated")
+            return True
+        try:
+            return await handler(tag, args[1:]) is not False
+        except (ValueError, IndexError, TypeError) as err:
+            self._tagged(tag, b"BAD", str(err).encode("utf-8", "replace"))
+            return True
+
+    def _untagged(self, line: bytes):
+        self.writer.write(b"* " + line + b"\r\n")
+
+    def _tagged(self, tag: bytes, state: bytes, text: bytes):
+        self.writer.write(tag + b" " + state + b" " + text + b"\r\n")
+
+    async def _capability(self, tag: bytes, _args: Sequence[_Arg]):
+        self._untagged(b"CAPABILITY " + b" ".join(self.server.capabilities))
+        self._tagged(tag, b"OK", b"CAPABILITY completed")
+
+    async def _noop(self, tag: bytes, _args: Sequence[_Arg]):
+        self._tagged(tag, b"OK", b"NOOP completed")
+
+    async def _login(self, tag: bytes, args: Sequence[_Arg]):
+        username, password = args
+        if (username, password) == (
+            self.server.username.encode("utf-8"),
+            self.server.password.encode("utf-8"),
+        ):
+            self.authenticated = True
+            self._tagged(tag, b"OK", b"LOGIN completed")
+        else:
+            self._tagged(tag, b"NO", b"[AUTHENTICATIONFAILED] Invalid credentials")
+
+    async def _logout(self, tag: bytes, _args: Sequence[_Arg]) -> bool:
+        self._untagged(b"BYE FakeImapServer logging out")
+        self._tagged(tag, b"OK", b"LOGOUT completed")
+        return False
+
+    async def _select(self, tag: bytes, args: Sequence[_Arg]):
+        self.selected = None
+        mailbox = self.server.get_mailbox(self._mailbox_name(args[0]))
+        if mailbox is None:
+            self._tagged(tag, b"NO", b"[NONEXISTENT] No such mailbox")
+            return
+        self.selected = mailbox
+        self._untagged(str(len(mailbox.messages)).encode("ascii") + b" EXISTS")
+        self._untagged(b"0 RECENT")
+        self._untagged(
+            b"OK [UIDVALIDITY "
+            + str(mailbox.uid_validity).encode("ascii")
+            + b"] UIDs valid"
+        )
+        self._untagged(
+            b"OK [UIDNEXT "
+            + str(mailbox.uid_next).encode("ascii")
+            + b"] Predicted next UID"
+        )
+        self._tagged(tag, b"OK", b"[READ-WRITE] SELECT completed")
+
+    async def _create(self, tag: bytes, args: Sequence[_Arg]):
+        name = self._mailbox_name(args[0])
+        if self.server.get_mailbox(name) is not None:
+            self._tagged(tag, b"NO", b"[ALREADYEXISTS] Mailbox exists")
+        else:
+            self.server.create_mailbox(name)
+            self._tagged(tag, b"OK", b"CREATE completed")
+
+    async def _delete(self, tag: bytes, args: Sequence[_Arg]):
+        name = self._mailbox_name(args[0])
+        mailbox = self.server.get_mailbox(name)
+        if mailbox is None:
+            self._tagged(tag, b"NO", b"[NONEXISTENT] No such mailbox")
+        else:
+            if mailbox is self.selected:
+                self.selected = None
+            self.server.delete_mailbox(name)
+            self._tagged(tag, b"OK", b"DELETE completed")
+
+    async def _uid(self, tag: bytes, args: Sequence[_Arg]):
+        subcommand = _atom(args[0]).upper()
+        handlers = {
+            b"FETCH": self._fetch,
+            b"STORE": self._store,
+            b"COPY": self._copy,
+            b"MOVE": self._move,
+        }
+        if subcommand not in handlers:
+            self._tagged(tag, b"BAD", b"Unknown UID command " + subcommand)
+            return
+        self.server.stats.commands[b"UID " + subcommand] += 1
+        await handlers[subcommand](tag, args[1:], use_uid=True)
+
+    def _resolve(
+        self, sequence_set: _Arg, use_uid: bool
+    ) -> List[Tuple[int, FakeMessage]]:
+        assert self.selected is not None
+        sequence_set = _atom(sequence_set)
+        messages = self.selected.messages
+        if use_uid:
+            largest = messages[-1].uid if messages else 0
+            uids = set(_parse_sequence_set(sequence_set, largest))
+            return [
+                (seq, message)
+                for seq, message in enumerate(messages, start=1)
+                if message.uid in uids
+            ]
+        return [
+            (seq, messages[seq - 1])
+            for seq in _parse_sequence_set(sequence_set, len(messages))
+            if 1 <= seq <= len(messages)
+        ]
+
+    def _require_selected(self, tag: bytes) -> bool:
+        if self.selected is None:
+            self._tagged(tag, b"BAD", b"No mailbox selected")
+            return False
+        return True
+
+    async def _fetch(self, tag: bytes, args: Sequence[_Arg], use_uid: bool = False):
+        if not self._require_selected(tag):
+            return
+        attrs = args[1] if isinstance(args[1], tuple) else (args[1],)
+        expanded: List[bytes] = []
+        for attr in map(_atom, attrs):
+            expanded.extend(_FETCH_MACROS.get(attr.upper(), (attr,)))
+        if use_uid and not any(attr.upper() == b"UID" for attr in expanded):
+            expanded.insert(0, b"UID")
+        for seq, message in self._resolve(args[0], use_uid):
+            items = [self._fetch_item(message, attr) for attr in expanded]
+            self._untagged(
+                str(seq).encode("ascii") + b" FETCH (" + b" ".join(items) + b")"
+            )
+            if self.server.chunk_pause_seconds:
+                await asyncio.sleep(self.server.chunk_pause_seconds)
+        self._tagged(tag, b"OK", b"FETCH completed")
+
+    def _fetch_item(self, message: FakeMessage, attr: bytes) -> bytes:
+        upper = attr.upper()
+        if upper == b"UID":
+            return b"UID " + str(message.uid).encode("ascii")
+        if upper == b"FLAGS":
+            return b"FLAGS (" + b" ".join(sorted(message.flags)) + b")"
+        if upper == b"INTERNALDATE":
+            return b"INTERNALDATE " + _quote(message.internal_date)
+        if upper == b"RFC822.SIZE":
+            return b"RFC822.SIZE " + str(len(message.content)).encode("ascii")
+        if upper == b"RFC822":
+            message.flags.add(b"\\Seen")
+            return b"RFC822 " + _literal(message.content)
+        if upper == b"RFC822.HEADER":
+            return b"RFC822.HEADER " + _literal(message.header)
+        if upper == b"RFC822.TEXT":
+            message.flags.add(b"\\Seen")
+            return b"RFC822.TEXT " + _literal(message.text)
+        body = _FETCH_BODY_PATTERN.match(attr)
+        if body is None:
+            raise ValueError(f"Unsupported FETCH attribute {attr!r}")
+        if body.group("name").upper() == b"BODY":
+            message.flags.add(b"\\Seen")
+        section = body.group("section")
+        data = self._section(message, section)
+        key = b"BODY[" + section + b"]"
+        if body.group("offset") is not None:
+            offset = int(body.group("offset"))
+            data = data[offset:]
+            if body.group("length") is not None:
+                data = data[: int(body.group("length"))]
+            key += b"<" + body.group("offset") + b">"
+        return key + b" " + _literal(data)
+
+    @staticmethod
+    def _section(message: FakeMessage, section: bytes) -> bytes:
+        upper = section.upper()
+        if upper == b"":
+            return message.content
+        if upper == b"HEADER":
+            return message.header
+        if upper == b"TEXT":
+            return message.text
+        fields = re.match(
+            rb"^HEADER\.FIELDS(?P<not>\.NOT)?\s*\((?P<names>[^)]*)\)$", upper
+        )
+        if fields:
+            names = set(fields.group("names").split())
+            exclude = fields.group("not") is not None
+            lines = re.findall(rb"[^\r\n]+\r\n(?:[ \t][^\r\n]*\r\n)*", message.header)
+            selected = [
+                line
+                for line in lines
+                if (line.split(b":", 1)[0].strip().upper() in names) != exclude
+            ]
+            return b"".join(selected) + b"\r\n"
+        raise ValueError(f"Unsupported body section {section!r}")
+
+    async def _store(self, tag: bytes, args: Sequence[_Arg], use_uid: bool = False):
+        if not self._require_selected(tag):
+            return
+        operation, flags = _atom(args[1]), args[2]
+        flags_set = set(flags if isinstance(flags, tuple) else (flags,))
+        operation = operation.upper()
+        silent = operation.endswith(b".SILENT")
+        operation = operation.removesuffix(b".SILENT")
+        for seq, message in self._resolve(args[0], use_uid):
+            if operation == b"+FLAGS":
+                message.flags.update(flags_set)
+            elif operation == b"-FLAGS":
+                message.flags.difference_update(flags_set)
+            elif operation == b"FLAGS":
+                message.flags = set(flags_set)
+            else:
+                raise ValueError(f"Unsupported STORE operation {operation!r}")
+            if not silent:
+                items = [self._fetch_item(message, b"FLAGS")]
+                if use_uid:
+                    items.append(self._fetch_item(message, b"UID"))
+                self._untagged(
+                    str(seq).encode("ascii") + b" FETCH (" + b" ".join(items) + b")"
+                )
+        self._tagged(tag, b"OK", b"STORE completed")
+
+    async def _copy(self, tag: bytes, args: Sequence[_Arg], use_uid: bool = False):
+        if not self._require_selected(tag):
+            return
+        destination = self.server.get_mailbox(self._mailbox_name(args[1]))
+        if destination is None:
+            self._tagged(tag, b"NO", b"[TRYCREATE] No such mailbox")
+            return
+        for _, message in self._resolve(args[0], use_uid):
+            destination.append(message.content, message.flags)
+        self._tagged(tag, b"OK", b"COPY completed")
+
+    async def _move(self, tag: bytes, args: Sequence[_Arg], use_uid: bool = False):
+        if b"MOVE" not in self.server.capabilities:
+            self._tagged(tag, b"BAD", b"MOVE not supported")
+            return
+        if not self._require_selected(tag):
+            return
+        assert self.selected is not None
+        destination = self.server.get_mailbox(self._mailbox_name(args[1]))
+        if destination is None:
+            self._tagged(tag, b"NO", b"[TRYCREATE] No such mailbox")
+            return
+        moved = self._resolve(args[0], use_uid)
+        for _, message in moved:
+            destination.append(message.content, message.flags)
+        self._remove(message for _, message in moved)
+        self._tagged(tag, b"OK", b"MOVE completed")
+
+    async def _expunge(self, tag: bytes, _args: Sequence[_Arg]):
+        if not self._require_selected(tag):
+            return
+        assert self.selected is not None
+        self._remove(
+            message
+            for message in self.selected.messages
+            if b"\\Deleted" in message.flags
+        )
+        self._tagged(tag, b"OK", b"EXPUNGE completed")
+
+    def _remove(self, messages: Iterable[FakeMessage]):
+        assert self.selected is not None
+        to_remove = {id(message) for message in messages}
+        seq = 1
+        remaining = []
+        for message in self.selected.messages:
+            if id(message) in to_remove:
+                self._untagged(str(seq).encode("ascii") + b" EXPUNGE")
+            else:
+                remaining.append(message)
+                seq += 1
+        self.selected.messages[:] = remaining
+
+    @staticmethod
+    def _mailbox_name(arg: _Arg) -> str:
+        return _atom(arg).decode("utf-8")
+
+
+class FakeImapServer:
+    """In-process IMAP4rev1 server implementing the subset used by ImapClient.
+
+    Latency, bandwidth, and the pause between sending individual FETCH
+    responses can be adjusted at any time, also while clients are connected.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        *,
+        host: str = "localhost",
+        port: int = 0,
+        username: str = "queue@localhost",
+        password: str = "password",
+        capabilities: Iterable[str] = ("IMAP4rev1", "MOVE"),
+        latency_seconds: float = 0.0,
+        bandwidth_bytes_per_second: Optional[float] = None,
+        chunk_pause_seconds: float = 0.0,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.capabilities = [c.encode("ascii") for c in capabilities]
+        self.latency_seconds = latency_seconds
+        self.bandwidth_bytes_per_second = bandwidth_bytes_per_second
+        self.chunk_pause_seconds = chunk_pause_seconds
+        self.mailboxes: Dict[str, FakeMailbox] = {"INBOX": FakeMailbox()}
+        self.stats = FakeImapServerStats()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: List[Task] = []
+        self._open_connections: Set[_FakeImapConnection] = set()
+
+    @property
+    def connection_config(self) -> ConnectionConfig:
+        return ConnectionConfig(
+            username=self.username,
+            password=self.password,
+            host=self.host,
+            port=self.port,
+            use_ssl=False,
+        )
+
+    def accepts_non_synchronizing_literal(self, size: int) -> bool:
+        return b"LITERAL+" in self.capabilities or (
+            b"LITERAL-" in self.capabilities and size <= 4096
+        )
+
+    @staticmethod
+    def _normalize_mailbox_name(name: str) -> str:
+        return "INBOX" if name.upper() == "INBOX" else name
+
+    def get_mailbox(self, name: str) -> Optional[FakeMailbox]:
+        return self.mailboxes.get(self._normalize_mailbox_name(name))
+
+    def create_mailbox(self, name: str) -> FakeMailbox:
+        name = self._normalize_mailbox_name(name)
+        if name not in self.mailboxes:
+            self.mailboxes[name] = FakeMailbox()
+        return self.mailboxes[name]
+
+    def delete_mailbox(self, name: str):
+        del self.mailboxes[self._normalize_mailbox_name(name)]
+
+    def add_message(self, content: bytes, mailbox: str = "INBOX") -> int:
+        return self.create_mailbox(mailbox).append(content).uid
+
+    def add_messages(
+        self, messages: Iterable[bytes], mailbox: str = "INBOX"
+    ) -> List[int]:
+        return [self.add_message(content, mailbox) for content in messages]
+
+    def count(self, mailbox: str = "INBOX") -> int:
+        found = self.get_mailbox(mailbox)
+        return 0 if found is None else len(found.messages)
+
+    async def __aenter__(self):
+        self._server = await start_server(
+            self._client_connected_cb, host=self.host, port=self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        assert self._server
+        self._server.close()
+        for connection in self._connections:
+            connection.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _client_connected_cb(self, reader: StreamReader, writer: StreamWriter):
+        self.stats.connections += 1
+        task = asyncio.current_task()
+        if task is not None:
+            self._connections.append(task)
+        connection = _FakeImapConnection(self, reader, writer)
+        self._open_connections.add(connection)
+        try:
+            await connection.run()
+        finally:
+            self._open_connections.discard(connection)
+
+    def drop_connections(self):
+        """Abort all client connections without a proper IMAP logout."""
+        for connection in self._open_connections:
+            connection.writer.abort()
+
+
+async def measure(coro: Awaitable[Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - start
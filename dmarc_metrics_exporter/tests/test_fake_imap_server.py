@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from dmarc_metrics_exporter.tests.fake_imap_server import FakeImapServer
+
+
+async def exchange(fake_imap: FakeImapServer, *commands: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection(fake_imap.host, fake_imap.port)
+    try:
+        await reader.readline()
+        writer.write(b"a0 LOGIN queue@localhost password\r\n")
+        for command in commands:
+            writer.write(command)
+        writer.write(b"z LOGOUT\r\n")
+        await writer.drain()
+        return await asyncio.wait_for(reader.read(), 5)
+    finally:
+        writer.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "command",
+    [
+        b"a1 UID (FETCH) 1 (UID)\r\n",
+        b"a1 FETCH 1 (FULL)\r\n",
+        b"a1 FETCH 1 ((UID))\r\n",
+        b"a1 STORE 1 (+FLAGS) (\\Seen)\r\n",
+        b"a1 CREATE (name)\r\n",
+    ],
+)
+async def test_responds_bad_to_malformed_commands(fake_imap, command):
+    fake_imap.add_message(b"Subject: test\r\n\r\nbody\r\n")
+    fake_imap.add_message(b"Subject: test\r\n\r\nbody\r\n")
+    response = await exchange(fake_imap, b"s SELECT INBOX\r\n", command)
+    assert b"\r\na1 BAD " in response
+    assert response.endswith(b"z OK LOGOUT completed\r\n")
@@ -1,6 +1,7 @@
 import asyncio
 import io
 import re
+import time
 from asyncio import (
     Condition,
     Event,
@@ -20,8 +21,10 @@ from dmarc_metrics_exporter.imap_client import (
     ConnectionConfig,
     ImapClient,
     ImapServerError,
+    _CommandScheduler,
 )
 from dmarc_metrics_exporter.tests.conftest import send_email, try_until_success
+from dmarc_metrics_exporter.tests.fake_imap_server import FakeImapServer
 from dmarc_metrics_exporter.tests.sample_emails import create_minimal_email
 
 logger = structlog.get_logger()
@@ -207,6 +210,124 @@ async def test_uid_expunge(greenmail):
         assert client.num_exists == 0
 
 
+@pytest.mark.asyncio
+async def test_fetch_from_fake_server(fake_imap: FakeImapServer):
+    fake_imap.add_message(create_minimal_email(content="üüüü").as_bytes())
+    async with ImapClient(fake_imap.connection_config) as client:
+        assert await client.select("INBOX") == 1
+        await client.fetch(b"1:1", b"(UID RFC822.SIZE BODY[HEADER.FIELDS (SUBJECT)])")
+        fetched_email = await wait_for(client.fetched_queue.get(), 5)
+        assert fetched_email[:2] == (1, b"FETCH")
+        assert dict((item[0], item[-1]) for item in fetched_email[2]) == {
+            b"UID": 1,
+            b"RFC822.SIZE": len(fake_imap.mailboxes["INBOX"].messages[0].content),
+            b"BODY": b"Subject: Minimal email\r\n\r\n",
+        }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("capabilities", [("IMAP4rev1", "MOVE"), ("IMAP4rev1",)])
+async def test_uid_move_graceful_on_fake_server(capabilities):
+    async with FakeImapServer(capabilities=capabilities) as fake_imap:
+        fake_imap.add_message(create_minimal_email().as_bytes())
+        uid = fake_imap.add_message(create_minimal_email().as_bytes())
+        async with ImapClient(fake_imap.connection_config) as client:
+            await client.create_if_not_exists("destination")
+            assert await client.select("INBOX") == 2
+            await client.uid_move_graceful(uid, "destination")
+            assert client.num_exists == 1
+            assert await client.select("destination") == 1
+        assert fake_imap.stats.commands[b"UID MOVE"] == int("MOVE" in capabilities)
+
+
+@pytest.mark.asyncio
+async def test_latency_of_fake_server_applies_per_round_trip():
+    async with FakeImapServer(latency_seconds=0.05) as fake_imap:
+        async with ImapClient(fake_imap.connection_config) as client:
+            start = time.perf_counter()
+            for _ in range(4):
+                await client.select("INBOX")
+            duration = time.perf_counter() - start
+    assert duration >= 4 * 0.05
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "capabilities, mailbox, expected_continuation_requests",
+    [
+        (("IMAP4rev1",), 'quotable \\ "name"', 0),
+        (("IMAP4rev1",), "non-ascii ü", 1),
+        (("IMAP4rev1", "LITERAL+"), "non-ascii ü", 0),
+        (("IMAP4rev1", "LITERAL-"), "non-ascii ü", 0),
+        (("IMAP4rev1", "LITERAL-"), "non-ascii ü" * 1000, 1),
+    ],
+)
+async def test_avoids_literal_continuation_round_trips(
+    capabilities, mailbox, expected_continuation_requests
+):
+    async with FakeImapServer(capabilities=capabilities) as fake_imap:
+        fake_imap.create_mailbox(mailbox)
+        async with ImapClient(fake_imap.connection_config) as client:
+            continuation_requests = fake_imap.stats.continuation_requests
+            assert await client.select(mailbox) == 0
+            assert (
+                fake_imap.stats.continuation_requests - continuation_requests
+                == expected_continuation_requests
+            )
+        assert fake_imap.stats.protocol_errors == 0
+
+
+@pytest.mark.asyncio
+async def test_pipelines_commands():
+    async with FakeImapServer(latency_seconds=0.1) as fake_imap:
+        uids = fake_imap.add_messages(
+            create_minimal_email().as_bytes() for _ in range(10)
+        )
+        async with ImapClient(fake_imap.connection_config) as client:
+            await client.select("INBOX")
+            start = time.perf_counter()
+            await asyncio.gather(
+                *(client.uid_store(uid, rb"+FLAGS.SILENT (\Seen)") for uid in uids)
+            )
+            duration = time.perf_counter() - start
+        assert all(
+            b"\\Seen" in message.flags
+            for message in fake_imap.mailboxes["INBOX"].messages
+        )
+    assert duration < 5 * 0.1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "in_flight, command, may_start",
+    [
+        ([], "SELECT", True),
+        (["FETCH"], "SELECT", False),
+        (["SELECT"], "FETCH", False),
+        (["UID STORE"], "UID STORE", True),
+        (["FETCH"], "UID MOVE", True),
+        (["FETCH", "STORE"], "FETCH", True),
+        (["UID MOVE"], "FETCH", False),
+        (["EXPUNGE"], "STORE", False),
+        (["UID COPY"], "UID MOVE", True),
+    ],
+)
+async def test_command_scheduler_respects_ambiguity_rules(
+    in_flight, command, may_start
+):
+    scheduler = _CommandScheduler()
+    for name in in_flight:
+        await scheduler.acquire(name)
+
+    acquire = asyncio.create_task(scheduler.acquire(command))
+    await asyncio.sleep(0.01)
+    assert acquire.done() == may_start
+
+    for name in in_flight:
+        await scheduler.release(name)
+    await asyncio.wait_for(acquire, 1)
+
+
 @pytest.mark.asyncio
 async def test_executes_same_command_type_sequentially():
     continue_triggers_change = Condition()
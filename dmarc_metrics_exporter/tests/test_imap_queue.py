@@ -2,10 +2,15 @@ import asyncio
 from email.message import EmailMessage
 
 import pytest
+import structlog
 
 from dmarc_metrics_exporter.imap_queue import ImapClient, ImapQueue
 
 from .conftest import send_email, try_until_success, verify_email_delivered
+from .fake_imap_server import FakeImapServer, measure
+from .sample_emails import create_email_with_attachment, create_zip_report
+
+logger = structlog.get_logger()
 
 
 def create_dummy_email(to: str):
@@ -142,6 +147,100 @@ async def test_reconnects_if_imap_connection_is_lost(greenmail):
             await queue.stop_consumer()
 
 
+async def drain_queue(queue: ImapQueue, fake_imap: FakeImapServer, msg_count: int):
+    processed = 0
+
+    async def handler(_queue_msg: EmailMessage):
+        nonlocal processed
+        processed += 1
+
+    def assert_all_done():
+        assert fake_imap.count(queue.folders.done) == msg_count
+
+    queue.consume(handler)
+    try:
+        await try_until_success(
+            assert_all_done, timeout_seconds=30, poll_interval_seconds=0.01
+        )
+    finally:
+        await queue.stop_consumer()
+    assert processed == msg_count
+
+
+@pytest.mark.asyncio
+async def test_processing_of_queue_messages_on_fake_server(fake_imap):
+    fake_imap.add_message(create_dummy_email(fake_imap.username).as_bytes())
+    queue = ImapQueue(connection=fake_imap.connection_config)
+
+    await drain_queue(queue, fake_imap, 1)
+
+    assert fake_imap.count() == 0
+    assert fake_imap.count(queue.folders.done) == 1
+
+
+@pytest.mark.asyncio
+async def test_recovers_from_connection_drop_while_moves_are_pending():
+    msg_count = 10
+    handled_msg_ids = []
+    async with FakeImapServer(latency_seconds=0.01) as fake_imap:
+        fake_imap.add_messages(
+            create_dummy_email(fake_imap.username).as_bytes() for _ in range(msg_count)
+        )
+
+        async def handler(queue_msg: EmailMessage):
+            handled_msg_ids.append(queue_msg["Message-ID"])
+            if len(handled_msg_ids) == msg_count // 2:
+                fake_imap.drop_connections()
+
+        queue = ImapQueue(
+            connection=fake_imap.connection_config,
+            poll_interval_seconds=0.1,
+            timeout_seconds=1,
+        )
+        queue.consume(handler)
+
+        def assert_all_done():
+            assert fake_imap.count(queue.folders.done) == msg_count
+
+        try:
+            await try_until_success(assert_all_done, timeout_seconds=10)
+        finally:
+            await queue.stop_consumer()
+
+        assert fake_imap.count() == 0
+        # Messages handled, but not yet moved at the time of the connection
+        # drop, are handled a second time. The number of such messages is
+        # bounded by the number of pipelined moves.
+        assert msg_count <= len(handled_msg_ids) <= msg_count + msg_count // 2
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+@pytest.mark.parametrize("latency_seconds", [0.0, 0.005])
+@pytest.mark.parametrize("msg_count", [1, 25])
+async def test_benchmark_queue_processing(latency_seconds, msg_count):
+    async with FakeImapServer(latency_seconds=latency_seconds) as fake_imap:
+        report = create_email_with_attachment(
+            create_zip_report(), to=fake_imap.username
+        ).as_bytes()
+        fake_imap.add_messages(report for _ in range(msg_count))
+        queue = ImapQueue(
+            connection=fake_imap.connection_config, poll_interval_seconds=60
+        )
+
+        _, duration = await measure(drain_queue(queue, fake_imap, msg_count))
+        assert fake_imap.count() == 0
+
+    await logger.ainfo(
+        "Benchmark: queue processing.",
+        latency_seconds=latency_seconds,
+        msg_count=msg_count,
+        duration_seconds=duration,
+        msgs_per_second=msg_count / duration,
+        bytes_sent=fake_imap.stats.bytes_sent,
+    )
+
+
 @pytest.mark.parametrize(
     "parsed_response",
     [